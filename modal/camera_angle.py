@@ -5,34 +5,112 @@ Modal serverless deployment for Qwen Camera Angle Control.
 Deploy with: modal deploy modal/camera_angle.py
 Test with: modal run modal/camera_angle.py
 
-NOTE: First request will take 5-10 minutes to download models (~35GB).
+NOTE: Models (~35GB) are downloaded into the volume while the image builds,
+      so the first request only pays the one-time LoRA fuse + NF4 snapshot
+      + compile warm-up (up to ~1 hour; all three are then cached on the volume).
       Subsequent requests will be fast (~10-30s).
 """
 
 import modal
 import io
-import base64
+import math
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+
+# Use Modal Volume for persistent model caching (also mounted during the image build)
+model_volume = modal.Volume.from_name("camera-angle-models", create_if_missing=True)
+MODEL_CACHE_PATH = "/models"
+
+# ============================================================================
+# MODEL DOWNLOAD (runs at image build time)
+# ============================================================================
+
+def download_models():
+    """
+    Pre-fetch every checkpoint file into the volume cache with parallel connections.
+    Runs once at image build time; from_pretrained then resolves from MODEL_CACHE_PATH
+    without hitting the network.
+    """
+    from huggingface_hub import snapshot_download
+    
+    weight_patterns = ["*.safetensors", "*.json", "*.txt"]
+    
+    print("[Download] Fetching base pipeline (text encoder, VAE, processor)...")
+    snapshot_download(
+        BASE_MODEL_ID,
+        cache_dir=MODEL_CACHE_PATH,
+        max_workers=DOWNLOAD_WORKERS,
+        allow_patterns=weight_patterns,
+        ignore_patterns=["transformer/*"],  # Replaced by the Rapid-AIO transformer
+    )
+    
+    print("[Download] Fetching Rapid-AIO transformer...")
+    snapshot_download(
+        TRANSFORMER_ID,
+        cache_dir=MODEL_CACHE_PATH,
+        max_workers=DOWNLOAD_WORKERS,
+        allow_patterns=[f"transformer/{pattern}" for pattern in weight_patterns],
+    )
+    
+    print("[Download] Fetching camera LoRA...")
+    snapshot_download(
+        LORA_ID,
+        cache_dir=MODEL_CACHE_PATH,
+        max_workers=DOWNLOAD_WORKERS,
+        allow_patterns=[LORA_WEIGHT_NAME],
+    )
+
 
 # ============================================================================
-# CONTAINER IMAGE (dependencies only - NO model download)
+# CONTAINER IMAGE (dependencies + model download into the volume)
 # ============================================================================
 
 image = (
     modal.Image.debian_slim(python_version="3.11")
+    .apt_install(
+        "gcc",  # Build pillow-simd from source
+        "libjpeg62-turbo-dev",
+        "zlib1g-dev",
+        "libwebp-dev",  # WebP output
+        "libturbojpeg0",  # Runtime library for PyTurboJPEG
+    )
     .pip_install(
         "torch>=2.0.0",
         "torchvision",  # Required for AutoVideoProcessor
-        "diffusers>=0.28.0",
+        "diffusers>=0.36.0",  # QwenImageEditPlusPipeline (added in 0.36) + group offloading
         "transformers>=4.36.0",
-        "accelerate>=0.25.0",
+        "accelerate>=1.1.0",  # pipe.to("cuda") with an NF4 (bitsandbytes) transformer
         "safetensors>=0.4.0",
-        "Pillow>=9.0.0",
+        "numpy",
+        "PyTurboJPEG",  # libjpeg-turbo SIMD JPEG decode
+        "pyspng",  # libspng PNG decode
         "huggingface-hub>=0.20.0",
+        "hf_transfer",  # Rust multi-connection downloader for snapshot_download
         "peft",  # Required for LoRA loading
-        "fastapi",  # Required for @modal.fastapi_endpoint
+        "bitsandbytes>=0.45.0",  # NF4 transformer quantization
+        "optimum-quanto",  # FP8 text encoder quantization
     )
+    # Replace the stock Pillow pulled in by torchvision/diffusers with the SIMD fork
+    .run_commands(
+        "pip uninstall -y pillow",
+        "CC='cc -mavx2' pip install --no-cache-dir --force-reinstall pillow-simd",
+    )
+    .env({"HF_HUB_ENABLE_HF_TRANSFER": "1"})
+    # Bake the checkpoints into the volume so cold starts never download
+    .run_function(download_models, volumes={MODEL_CACHE_PATH: model_volume})
+)
+
+# Web endpoint image - parses uploads and forwards them to the GPU class
+web_image = modal.Image.debian_slim(python_version="3.11").pip_install(
+    "fastapi",  # Required for @modal.fastapi_endpoint
+    "python-multipart",  # Required for multipart/form-data uploads
 )
 
+# FastAPI is only needed inside the web endpoint containers
+with web_image.imports():
+    import fastapi
+
 # Create the Modal app
 app = modal.App("camera-angle-control", image=image)
 
@@ -45,9 +123,47 @@ TRANSFORMER_ID = "linoyts/Qwen-Image-Edit-Rapid-AIO"
 LORA_ID = "dx8152/Qwen-Edit-2509-Multiple-angles"
 LORA_WEIGHT_NAME = "镜头转换.safetensors"
 
-# Use Modal Volume for persistent model caching
-model_volume = modal.Volume.from_name("camera-angle-models", create_if_missing=True)
-MODEL_CACHE_PATH = "/models"
+# Rapid-AIO transformer with the camera LoRA merged in (written once by fuse_lora_weights)
+FUSED_TRANSFORMER_PATH = f"{MODEL_CACHE_PATH}/fused_transformer"
+FUSED_TRANSFORMER_SENTINEL = f"{FUSED_TRANSFORMER_PATH}/.complete"
+LORA_SCALE = 1.25
+
+# Single-file snapshot of the fused + NF4-quantized transformer (written after first load)
+NF4_SNAPSHOT_PATH = f"{MODEL_CACHE_PATH}/fused_transformer_nf4"
+NF4_SNAPSHOT_SENTINEL = f"{NF4_SNAPSHOT_PATH}/.complete"
+
+# Max number of memoized (prompt, condition image) text encoder outputs
+PROMPT_CACHE_SIZE = 64
+
+# Native ~1MP latent buckets (width, height); inputs are padded to the closest aspect ratio
+BUCKETS = [(1024, 1024), (1152, 896), (896, 1152), (1344, 768), (768, 1344)]
+
+# Rapid-AIO is distilled for guidance-free sampling. The pipeline only runs its negative
+# (unconditional) transformer pass when true_cfg_scale > 1 AND a negative prompt is given,
+# so neither is ever passed: one transformer forward per step, batch = number of prompts.
+TRUE_CFG_SCALE = 1.0
+
+# Request batching - concurrent generate calls are coalesced into one forward pass
+MAX_BATCH_SIZE = 4
+BATCH_WAIT_MS = 50
+
+# Batch sizes the transformer is compiled for; partial groups are padded up to MAX_BATCH_SIZE
+COMPILED_BATCH_SIZES = (1, MAX_BATCH_SIZE)
+
+# First container start on an empty volume (see CameraAngle); web requests wait this long too
+COLD_START_TIMEOUT = 3600
+
+# Prompt embeddings are zero-padded to this many tokens (condition image tokens + the
+# longest combined camera prompt fit well inside) so the compiled transformer sees one
+# text length per bucket and batch size instead of one per prompt. The padding is
+# excluded from attention with an explicit mask, so it doesn't change the output.
+PROMPT_EMBED_LENGTH = 320
+
+# Inductor/FX graph cache on the volume - later cold starts reuse the compiled kernels
+INDUCTOR_CACHE_PATH = f"{MODEL_CACHE_PATH}/inductor_cache"
+
+# Parallel file downloads per snapshot (each large shard also uses hf_transfer's own connections)
+DOWNLOAD_WORKERS = 16
 
 
 # ============================================================================
@@ -70,6 +186,25 @@ PROMPT_TEMPLATES = {
 }
 
 
+def _build_prompt_cache() -> dict:
+    """Pre-join every (rotation sign, tilt bin, zoom bin) combination into one template."""
+    rotation_parts = {-1: PROMPT_TEMPLATES["rotate_left"], 0: None, 1: PROMPT_TEMPLATES["rotate_right"]}
+    tilt_parts = {-1: PROMPT_TEMPLATES["worms_eye"], 0: None, 1: PROMPT_TEMPLATES["birds_eye"]}
+    zoom_parts = {0: None, 1: PROMPT_TEMPLATES["close_up"]}
+    
+    cache = {}
+    for rot_sign, rotation_part in rotation_parts.items():
+        for tilt_bin, tilt_part in tilt_parts.items():
+            for zoom_bin, zoom_part in zoom_parts.items():
+                parts = [part for part in (rotation_part, tilt_part, zoom_part) if part]
+                cache[(rot_sign, tilt_bin, zoom_bin)] = " ".join(parts) or PROMPT_TEMPLATES["no_movement"]
+    return cache
+
+
+# Full prompt per (rot_sign, tilt_bin, zoom_bin); rotation templates keep a {degrees} slot
+_PROMPT_CACHE = _build_prompt_cache()
+
+
 def build_camera_prompt(rotation: float = 0.0, tilt: float = 0.0, zoom: float = 0.0) -> str:
     """Build camera movement prompt from control values.
     
@@ -78,31 +213,165 @@ def build_camera_prompt(rotation: float = 0.0, tilt: float = 0.0, zoom: float =
         tilt: Vertical tilt in degrees. Positive = camera looks down (bird's-eye), negative = looks up (worm's-eye).
         zoom: Zoom level 0-10. Higher = closer.
     """
-    prompt_parts = []
-    
-    # Rotation: horizontal camera movement around subject
-    if rotation != 0:
-        degrees = abs(int(rotation))
-        if rotation > 0:
-            # Positive rotation = camera moves to the right of subject
-            prompt_parts.append(PROMPT_TEMPLATES["rotate_right"].format(degrees=degrees))
-        else:
-            # Negative rotation = camera moves to the left of subject
-            prompt_parts.append(PROMPT_TEMPLATES["rotate_left"].format(degrees=degrees))
+    # Rotation: horizontal camera movement around subject (positive = right of subject)
+    rot_sign = (rotation > 0) - (rotation < 0)
     
     # Tilt: vertical camera angle
     # The demo shows that mixing specific degrees for rotation with categorical tilt works best
-    if tilt > 5:
-        prompt_parts.append(PROMPT_TEMPLATES["birds_eye"])
-    elif tilt < -5:
-        prompt_parts.append(PROMPT_TEMPLATES["worms_eye"])
+    tilt_bin = 1 if tilt > 5 else (-1 if tilt < -5 else 0)
     
     # Zoom
-    if zoom > 5:
-        prompt_parts.append(PROMPT_TEMPLATES["close_up"])
+    zoom_bin = 1 if zoom > 5 else 0
+    
+    template = _PROMPT_CACHE[(rot_sign, tilt_bin, zoom_bin)]
+    if rot_sign:
+        return template.replace("{degrees}", str(abs(int(rotation))))
+    return template
+
+
+# ============================================================================
+# IMAGE DECODING / BUCKETING
+# ============================================================================
+
+JPEG_MAGIC = b"\xff\xd8\xff"
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+
+# Errors the fast decoders raise on inputs they can't handle; Pillow gets a second try
+DECODE_ERRORS = (OSError, RuntimeError, ValueError)
+
+
+@lru_cache(maxsize=1)
+def get_turbojpeg():
+    """Create the TurboJPEG handle once (loads libturbojpeg)."""
+    from turbojpeg import TurboJPEG
+    return TurboJPEG()
+
+
+def decode_image(data: bytes):
+    """
+    Decode uploaded image bytes to an RGB PIL Image.
+    JPEG goes through libjpeg-turbo, 8-bit PNG through libspng; anything else uses Pillow.
+    """
+    from PIL import Image
+    
+    if data.startswith(JPEG_MAGIC):
+        from turbojpeg import TJPF_RGB
+        try:
+            return Image.fromarray(get_turbojpeg().decode(data, pixel_format=TJPF_RGB))
+        except DECODE_ERRORS:
+            pass  # CMYK/YCCK, arithmetic-coded, truncated, ... - let Pillow try
+    
+    if data.startswith(PNG_MAGIC):
+        import pyspng
+        try:
+            pixels = pyspng.load(data)
+            if pixels.dtype.name == "uint8":
+                return Image.fromarray(pixels).convert("RGB")
+        except DECODE_ERRORS:
+            pass  # Let Pillow try (and raise a proper error for broken files)
+    
+    return Image.open(io.BytesIO(data)).convert("RGB")
+
+
+def fit_to_bucket(image):
+    """
+    Resize (aspect-preserving, LANCZOS) and pad an image to the closest BUCKETS shape.
+    
+    Returns:
+        Tuple of (padded_image, content_box) where content_box is the
+        (left, top, right, bottom) region holding the original image.
+    """
+    from PIL import Image, ImageOps
+    
+    ratio = image.width / image.height
+    bucket = min(BUCKETS, key=lambda size: abs(math.log(size[0] / size[1] / ratio)))
+    
+    resized = ImageOps.contain(image, bucket, method=Image.LANCZOS)
+    left = (bucket[0] - resized.width) // 2
+    top = (bucket[1] - resized.height) // 2
+    
+    padded = Image.new("RGB", bucket)
+    padded.paste(resized, (left, top))
+    return padded, (left, top, left + resized.width, top + resized.height)
+
+
+# ============================================================================
+# RESPONSE HELPERS
+# ============================================================================
+
+def image_response(content: bytes, media_type: str, prompt: str, seed: int, inference_time: float):
+    """Wrap raw image bytes in a Response, with generation metadata in headers."""
+    from urllib.parse import quote
     
-    final_prompt = " ".join(prompt_parts).strip()
-    return final_prompt if final_prompt else PROMPT_TEMPLATES["no_movement"]
+    return fastapi.Response(
+        content=content,
+        media_type=media_type or "application/octet-stream",
+        headers={
+            "X-Prompt": quote(prompt),  # Headers must be latin-1; prompt contains Chinese text
+            "X-Seed": str(seed),
+            "X-Inference-Time-Ms": f"{inference_time:.1f}",
+            "Access-Control-Expose-Headers": "X-Prompt, X-Seed, X-Inference-Time-Ms",
+        },
+    )
+
+
+# ============================================================================
+# LORA FUSION (one-shot, cached on the volume)
+# ============================================================================
+
+def build_fused_transformer():
+    """
+    Merge the camera angle LoRA into the Rapid-AIO transformer and save it to the volume.
+    Containers then load the merged weights directly and never touch the LoRA.
+    """
+    import torch
+    from diffusers import QwenImageEditPlusPipeline, QwenImageTransformer2DModel
+    
+    print("[Fuse] Loading transformer...")
+    transformer = QwenImageTransformer2DModel.from_pretrained(
+        TRANSFORMER_ID,
+        subfolder='transformer',
+        torch_dtype=torch.bfloat16,
+        cache_dir=MODEL_CACHE_PATH,
+        low_cpu_mem_usage=True,
+    )
+    
+    # Only the transformer is needed for fusing - skip text encoder and VAE
+    pipe = QwenImageEditPlusPipeline.from_pretrained(
+        BASE_MODEL_ID,
+        transformer=transformer,
+        text_encoder=None,
+        vae=None,
+        torch_dtype=torch.bfloat16,
+        cache_dir=MODEL_CACHE_PATH,
+    )
+    
+    print("[Fuse] Loading LoRA...")
+    pipe.load_lora_weights(
+        LORA_ID,
+        weight_name=LORA_WEIGHT_NAME,
+        adapter_name="angles",
+        cache_dir=MODEL_CACHE_PATH,
+    )
+    pipe.set_adapters(["angles"], adapter_weights=[1.0])
+    pipe.fuse_lora(adapter_names=["angles"], lora_scale=LORA_SCALE)
+    pipe.unload_lora_weights()
+    
+    print(f"[Fuse] Saving fused transformer to {FUSED_TRANSFORMER_PATH}...")
+    pipe.transformer.save_pretrained(FUSED_TRANSFORMER_PATH, safe_serialization=True)
+    open(FUSED_TRANSFORMER_SENTINEL, "w").close()  # Marks the save as complete
+    model_volume.commit()
+    print("[Fuse] Done!")
+
+
+@app.function(
+    memory=65536,  # 64GB RAM - fusion runs on CPU
+    timeout=1800,
+    volumes={MODEL_CACHE_PATH: model_volume},
+)
+def fuse_lora_weights():
+    """Pre-build the fused transformer: modal run modal/camera_angle.py::fuse_lora_weights"""
+    build_fused_transformer()
 
 
 # ============================================================================
@@ -112,7 +381,10 @@ def build_camera_prompt(rotation: float = 0.0, tilt: float = 0.0, zoom: float =
 @app.cls(
     gpu="A100",  # 40GB VRAM - enough for full model
     memory=65536,  # 64GB RAM (needed for loading large checkpoint shards)
-    timeout=900,  # 15 min timeout for first-time model download
+    # Budget for the first cold start on an empty volume: LoRA fuse (~40GB bf16 load + save),
+    # NF4 snapshot, then compiling all len(BUCKETS) * len(COMPILED_BATCH_SIZES) shapes. Later
+    # starts load the snapshot and reuse the volume's inductor cache in a few minutes.
+    timeout=COLD_START_TIMEOUT,
     scaledown_window=300,  # Shut down after 5 min idle
     volumes={MODEL_CACHE_PATH: model_volume},
 )
@@ -123,12 +395,17 @@ class CameraAngle:
     def load_model(self):
         """
         Load model when container starts.
-        First run downloads ~35GB models (takes 5-10 min).
-        Subsequent runs load from cached volume (takes ~60s).
+        First run fuses the camera LoRA into the pre-downloaded transformer.
+        Subsequent runs load a single-file NF4 snapshot of the fused transformer from the volume.
         """
         import os
         import torch
-        from diffusers import QwenImageEditPlusPipeline, QwenImageTransformer2DModel
+        from diffusers import (
+            BitsAndBytesConfig,
+            QwenImageEditPlusPipeline,
+            QwenImageTransformer2DModel,
+        )
+        from optimum.quanto import freeze, qfloat8, quantize
         
         # Set HuggingFace cache to persistent volume
         os.environ["HF_HOME"] = MODEL_CACHE_PATH
@@ -139,15 +416,42 @@ class CameraAngle:
         print(f"[Enter] GPU: {torch.cuda.get_device_name(0)}")
         print(f"[Enter] VRAM: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.1f} GB")
         
-        # Load pipeline with fast transformer
-        print("[Enter] Loading transformer...")
-        transformer = QwenImageTransformer2DModel.from_pretrained(
-            TRANSFORMER_ID,
-            subfolder='transformer',
-            torch_dtype=torch.bfloat16,
-            cache_dir=MODEL_CACHE_PATH,
-            low_cpu_mem_usage=True,  # Memory-efficient loading
-        )
+        # Persist compiled kernels next to the weights (read by torch.compile below)
+        os.environ["TORCHINDUCTOR_CACHE_DIR"] = INDUCTOR_CACHE_PATH
+        os.environ["TORCHINDUCTOR_FX_GRAPH_CACHE"] = "1"
+        
+        if os.path.exists(NF4_SNAPSHOT_SENTINEL):
+            # Pre-quantized snapshot: one mmap'd safetensors file, no re-quantization
+            print("[Enter] Loading NF4 transformer snapshot...")
+            transformer = QwenImageTransformer2DModel.from_pretrained(
+                NF4_SNAPSHOT_PATH,
+                torch_dtype=torch.bfloat16,
+            )
+        else:
+            # Fused transformer is built once and cached on the volume
+            if not os.path.exists(FUSED_TRANSFORMER_SENTINEL):
+                print("[Enter] Fused transformer not found - building it (one-time)...")
+                build_fused_transformer()
+            
+            # Load pipeline with fast transformer (camera LoRA already merged).
+            # Quantize to NF4 so weights stay 4-bit on GPU during compute.
+            print("[Enter] Loading fused transformer (NF4)...")
+            quantization_config = BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_quant_type="nf4",
+                bnb_4bit_compute_dtype=torch.bfloat16,
+            )
+            transformer = QwenImageTransformer2DModel.from_pretrained(
+                FUSED_TRANSFORMER_PATH,
+                quantization_config=quantization_config,
+                torch_dtype=torch.bfloat16,
+                low_cpu_mem_usage=True,  # Memory-efficient loading
+            )
+            
+            # Snapshot the quantized weights so later cold starts skip fusing + quantizing
+            print(f"[Enter] Saving NF4 snapshot to {NF4_SNAPSHOT_PATH}...")
+            transformer.save_pretrained(NF4_SNAPSHOT_PATH, safe_serialization=True, max_shard_size="100GB")
+            open(NF4_SNAPSHOT_SENTINEL, "w").close()
         
         print("[Enter] Loading base pipeline...")
         self.pipe = QwenImageEditPlusPipeline.from_pretrained(
@@ -157,106 +461,299 @@ class CameraAngle:
             cache_dir=MODEL_CACHE_PATH,
             low_cpu_mem_usage=True,  # Memory-efficient loading
         )
-        # Model is ~40GB - too large for A100-40GB. Use CPU offloading.
-        print("[Enter] Enabling sequential CPU offloading...")
-        self.pipe.enable_sequential_cpu_offload()
         
-        # Load camera angle LoRA
-        print("[Enter] Loading LoRA...")
-        self.pipe.load_lora_weights(
-            LORA_ID,
-            weight_name=LORA_WEIGHT_NAME,
-            adapter_name="angles",
-            cache_dir=MODEL_CACHE_PATH,
-        )
+        # Text encoder to FP8 weights (~2x smaller); prompts are tiny so the loss is invisible
+        print("[Enter] Quantizing text encoder to FP8...")
+        quantize(self.pipe.text_encoder, weights=qfloat8)
+        freeze(self.pipe.text_encoder)
+        
+        # NF4 transformer (~11GB) + FP8 text encoder + bf16 VAE fit in 40GB,
+        # so keep the whole pipeline resident - no per-step host<->device copies
+        print("[Enter] Moving pipeline to GPU...")
+        self.pipe.to("cuda")
+        
+        # Decode in tiles (and one image at a time for batches) to cap the VAE activation peak
+        self.pipe.vae.enable_tiling()
+        self.pipe.vae.enable_slicing()
+        
+        # Memoize text encoder outputs. Qwen-Image-Edit encodes the prompt together
+        # with the condition image, so the cache is keyed on both.
+        self._prompt_cache = OrderedDict()
+        self._encode_prompt = self.pipe.encode_prompt
+        self.pipe.encode_prompt = self._cached_encode_prompt
         
-        # Fuse LoRA for faster inference
-        self.pipe.set_adapters(["angles"], adapter_weights=[1.0])
-        self.pipe.fuse_lora(adapter_names=["angles"], lora_scale=1.25)
-        self.pipe.unload_lora_weights()
+        # Compile transformer + VAE decode; CUDA graphs remove per-launch overhead
+        print("[Enter] Compiling transformer and VAE decode...")
+        self.pipe.transformer = torch.compile(
+            self.pipe.transformer, mode="reduce-overhead", fullgraph=False, dynamic=False
+        )
+        self.pipe.vae.decode = torch.compile(
+            self.pipe.vae.decode, mode="reduce-overhead", fullgraph=False, dynamic=False
+        )
+        self._warmup()
         
-        # Commit volume to persist downloaded models
+        # Commit volume to persist the transformer snapshots and the inductor cache
         model_volume.commit()
         
         print("[Enter] Model loaded successfully!")
     
-    @modal.fastapi_endpoint(method="POST")
-    def generate(self, request: dict) -> dict:
-        """Generate camera angle adjusted image."""
+    def _cached_encode_prompt(self, prompt=None, image=None, prompt_embeds=None, **kwargs):
+        """LRU-cached drop-in for pipe.encode_prompt keyed on prompt + condition image pixels."""
+        import torch
+        
+        images = image if isinstance(image, list) else [image]
+        if prompt_embeds is not None or not isinstance(prompt, str) or not all(hasattr(img, "tobytes") for img in images):
+            return self._encode_prompt(prompt=prompt, image=image, prompt_embeds=prompt_embeds, **kwargs)
+        
+        digest = hashlib.sha1()
+        for img in images:
+            digest.update(img.tobytes())
+        key = (prompt, digest.hexdigest(), kwargs.get("num_images_per_prompt", 1), kwargs.get("max_sequence_length"))
+        
+        if key in self._prompt_cache:
+            self._prompt_cache.move_to_end(key)
+            return self._prompt_cache[key]
+        
+        # Cached outputs must not hold an autograd graph (the text encoder's activations)
+        with torch.inference_mode():
+            result = self._encode_prompt(prompt=prompt, image=image, **kwargs)
+        result = tuple(t.detach() if t is not None else None for t in result)
+        self._prompt_cache[key] = result
+        if len(self._prompt_cache) > PROMPT_CACHE_SIZE:
+            self._prompt_cache.popitem(last=False)
+        return result
+    
+    def _warmup(self):
+        """
+        Run one dummy generation per (bucket, compiled batch size) so real requests never compile.
+        Warm-up goes through the same padded prompt_embeds path as generate_batch, so with
+        mode="reduce-overhead" every shape a request can hit has a recorded CUDA graph.
+        """
+        import time
         import torch
         from PIL import Image
         
-        # Parse request
-        image_b64 = request.get("image", "")
-        rotation = request.get("rotation", 0.0)
-        tilt = request.get("tilt", 0.0)
-        zoom = request.get("zoom", 0.0)
-        seed = request.get("seed")
-        num_steps = request.get("num_steps", 4)
+        # One compiled graph per (bucket, batch size) - keep dynamo from falling back to eager
+        torch._dynamo.config.cache_size_limit = max(
+            torch._dynamo.config.cache_size_limit, len(BUCKETS) * len(COMPILED_BATCH_SIZES)
+        )
         
-        # Log received values
-        print("=" * 60)
-        print("[Generate] Received request:")
-        print(f"  rotation: {rotation}")
-        print(f"  tilt: {tilt}")
-        print(f"  zoom: {zoom}")
-        print(f"  seed: {seed}")
-        print(f"  num_steps: {num_steps}")
-        print(f"  image length: {len(image_b64)} chars")
+        prompt = PROMPT_TEMPLATES["rotate_right"].format(degrees=45)
+        for width, height in BUCKETS:
+            input_image = Image.new("RGB", (width, height))
+            for batch_size in COMPILED_BATCH_SIZES:
+                print(f"[Enter] Warming up compiled pipeline at {width}x{height}, batch {batch_size}...")
+                start_time = time.time()
+                with torch.inference_mode():
+                    prompt_embeds, prompt_embeds_mask, attention_mask = self._encode_batch(input_image, [prompt] * batch_size)
+                    self.pipe(
+                        image=[input_image],
+                        prompt_embeds=prompt_embeds,
+                        prompt_embeds_mask=prompt_embeds_mask,
+                        height=height,
+                        width=width,
+                        num_inference_steps=4,
+                        generator=[torch.Generator(device="cuda").manual_seed(0) for _ in range(batch_size)],
+                        true_cfg_scale=TRUE_CFG_SCALE,
+                        attention_kwargs={"attention_mask": attention_mask},
+                    )
+                print(f"[Enter] Warm-up done in {time.time() - start_time:.1f}s")
+    
+    def _encode_batch(self, input_image, prompts: list):
+        """
+        Encode several prompts against one input image into a padded embedding batch.
+        QwenImageEditPlusPipeline treats a list of images as multiple references for a
+        single prompt, so batches are passed to it as precomputed prompt_embeds instead.
+        
+        Returns:
+            Tuple of (prompt_embeds, prompt_embeds_mask, attention_mask) - pass the last
+            one as attention_kwargs={"attention_mask": ...}
+        """
+        import torch
+        import torch.nn.functional as F
+        from diffusers.pipelines.qwenimage.pipeline_qwenimage_edit_plus import (
+            CONDITION_IMAGE_SIZE,
+            VAE_IMAGE_SIZE,
+            calculate_dimensions,
+        )
+        
+        # Same condition image the pipeline would build internally
+        ratio = input_image.width / input_image.height
+        width, height = calculate_dimensions(CONDITION_IMAGE_SIZE, ratio)
+        condition_image = self.pipe.image_processor.resize(input_image, height, width)
         
-        # Build prompt
-        prompt = build_camera_prompt(rotation, tilt, zoom)
-        print(f"[Generate] Built prompt: {prompt}")
-        print("=" * 60)
+        encoded = [self.pipe.encode_prompt(prompt=p, image=[condition_image], device="cuda") for p in prompts]
         
-        if prompt == "no camera movement":
-            print("[Generate] No movement - returning original image")
-            return {"image": image_b64, "prompt": prompt, "seed": 0}
+        # Fixed length keeps compiled shapes stable; an unusually long prompt just recompiles
+        max_len = max([PROMPT_EMBED_LENGTH] + [embeds.shape[1] for embeds, _ in encoded])
+        prompt_embeds = torch.cat([
+            F.pad(embeds, (0, 0, 0, max_len - embeds.shape[1])) for embeds, _ in encoded
+        ])
+        text_mask = torch.cat([
+            F.pad(
+                mask.bool() if mask is not None else torch.ones(embeds.shape[:2], dtype=torch.bool, device=embeds.device),
+                (0, max_len - embeds.shape[1]),
+            )
+            for embeds, mask in encoded
+        ])
         
-        # Decode input image
-        if "," in image_b64:
-            image_b64 = image_b64.split(",")[1]
-        image_data = base64.b64decode(image_b64)
-        input_image = Image.open(io.BytesIO(image_data)).convert("RGB")
+        # The pipeline only uses prompt_embeds_mask to size the text RoPE (max(mask.sum()),
+        # which must cover the padded length) - the transformer never applies it in attention.
+        # Padding is masked out explicitly instead, with a joint [text, image] attention mask.
+        prompt_embeds_mask = torch.ones(prompt_embeds.shape[:2], dtype=torch.long, device=prompt_embeds.device)
         
-        # Generate seed
-        if seed is None:
-            import random
-            seed = random.randint(0, 2**32 - 1)
+        # Image stream = output latents + the VAE-encoded input image, both in 2x2 patches
+        patch = self.pipe.vae_scale_factor * 2
+        vae_width, vae_height = calculate_dimensions(VAE_IMAGE_SIZE, ratio)
+        image_len = (input_image.height // patch) * (input_image.width // patch) + (vae_height // patch) * (vae_width // patch)
+        image_mask = torch.ones((len(prompts), image_len), dtype=torch.bool, device=text_mask.device)
+        attention_mask = torch.cat([text_mask, image_mask], dim=1)[:, None, None, :]
         
-        generator = torch.Generator(device="cuda").manual_seed(seed)
+        return prompt_embeds, prompt_embeds_mask, attention_mask
+    
+    @modal.batched(max_batch_size=MAX_BATCH_SIZE, wait_ms=BATCH_WAIT_MS)
+    def generate_batch(
+        self,
+        image_bytes: list[bytes],
+        prompts: list[str],
+        seeds: list[int],
+        num_steps: list[int],
+    ) -> list[dict]:
+        """
+        Generate camera angle adjusted images for concurrently queued requests.
+        Requests sharing the same input image and step count run as one batched forward.
         
-        # Run inference
+        Returns:
+            One {"image": webp_bytes, "inference_time_ms": float} dict per request, or
+            {"error": message, "status_code": int} if that request's group failed
+        """
         import time
-        start_time = time.time()
+        import torch
         
-        result = self.pipe(
-            image=[input_image],
-            prompt=prompt,
-            num_inference_steps=num_steps,
-            generator=generator,
-            true_cfg_scale=1.0,
-            num_images_per_prompt=1,
-        ).images[0]
+        # Group requests by (input image, steps) - each group is one pipeline call
+        groups = {}
+        for index, (data, steps) in enumerate(zip(image_bytes, num_steps)):
+            groups.setdefault((hashlib.sha1(data).digest(), steps), []).append(index)
         
-        inference_time = (time.time() - start_time) * 1000
+        print(f"[Generate] Batch of {len(prompts)} request(s) in {len(groups)} group(s)")
+        results = [None] * len(prompts)
         
-        # Encode result
-        buffer = io.BytesIO()
-        result.save(buffer, format="PNG")
-        result_b64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
+        for (_, steps), indices in groups.items():
+            # A bad upload only fails the requests that sent it, not the whole batch
+            try:
+                input_image, content_box = fit_to_bucket(decode_image(image_bytes[indices[0]]))
+            except Exception as e:
+                print(f"[Generate] Could not decode input image: {e}")
+                for index in indices:
+                    results[index] = {"error": f"Invalid image: {e}", "status_code": 400}
+                continue
+            width, height = input_image.size
+            
+            # Run inference
+            start_time = time.time()
+            
+            # Pad partial groups to MAX_BATCH_SIZE (repeating the last request) so the compiled
+            # transformer only sees COMPILED_BATCH_SIZES; the extra outputs are dropped below
+            batch = indices
+            if len(indices) not in COMPILED_BATCH_SIZES:
+                batch = indices + [indices[-1]] * (MAX_BATCH_SIZE - len(indices))
+            
+            # encode_prompt runs outside the pipeline's no_grad __call__ - no autograd anywhere
+            try:
+                with torch.inference_mode():
+                    prompt_embeds, prompt_embeds_mask, attention_mask = self._encode_batch(
+                        input_image, [prompts[i] for i in batch]
+                    )
+                    images = self.pipe(
+                        image=[input_image],
+                        prompt_embeds=prompt_embeds,
+                        prompt_embeds_mask=prompt_embeds_mask,
+                        height=height,
+                        width=width,
+                        num_inference_steps=steps,
+                        generator=[torch.Generator(device="cuda").manual_seed(seeds[i]) for i in batch],
+                        true_cfg_scale=TRUE_CFG_SCALE,
+                        attention_kwargs={"attention_mask": attention_mask},
+                    ).images
+            except Exception as e:
+                print(f"[Generate] Inference failed: {e}")
+                for index in indices:
+                    results[index] = {"error": f"Generation failed: {e}", "status_code": 500}
+                continue
+            
+            inference_time = (time.time() - start_time) * 1000
+            
+            # Encode results as WebP (much smaller and cheaper than PNG + base64)
+            for index, result in zip(indices, images):
+                result = result.crop(content_box)
+                buffer = io.BytesIO()
+                result.save(buffer, format="WEBP", quality=90, method=4)
+                results[index] = {"image": buffer.getvalue(), "inference_time_ms": inference_time}
         
-        return {
-            "image": result_b64,
-            "prompt": prompt,
-            "seed": seed,
-            "inference_time_ms": inference_time
-        }
+        return results
+
+
+# ============================================================================
+# WEB ENDPOINTS (lightweight CPU containers in front of the GPU class)
+# ============================================================================
+
+@app.function(image=web_image, timeout=COLD_START_TIMEOUT)  # Awaits the GPU container's cold start
+@modal.fastapi_endpoint(method="POST")
+async def generate(request: "fastapi.Request") -> "fastapi.Response":
+    """
+    Generate camera angle adjusted image.
     
-    @modal.fastapi_endpoint(method="GET")
-    def health(self) -> dict:
-        """Health check endpoint."""
-        return {"status": "ok", "model": "Qwen Camera Angle Control"}
+    Expects multipart/form-data with an `image` file and rotation/tilt/zoom/seed/num_steps
+    fields. Returns raw image/webp bytes; prompt, seed and timing go in X-* headers.
+    """
+    # Parse request
+    form = await request.form()
+    upload = form["image"]
+    image_bytes = await upload.read()
+    rotation = float(form.get("rotation", 0.0))
+    tilt = float(form.get("tilt", 0.0))
+    zoom = float(form.get("zoom", 0.0))
+    seed = int(form["seed"]) if form.get("seed") else None
+    num_steps = int(form.get("num_steps", 4))
+    
+    # Log received values
+    print("=" * 60)
+    print("[Generate] Received request:")
+    print(f"  rotation: {rotation}")
+    print(f"  tilt: {tilt}")
+    print(f"  zoom: {zoom}")
+    print(f"  seed: {seed}")
+    print(f"  num_steps: {num_steps}")
+    print(f"  image size: {len(image_bytes)} bytes")
+    
+    # Build prompt
+    prompt = build_camera_prompt(rotation, tilt, zoom)
+    print(f"[Generate] Built prompt: {prompt}")
+    print("=" * 60)
+    
+    # No-op: echo the uploaded bytes untouched - no decode, no GPU container
+    if prompt == PROMPT_TEMPLATES["no_movement"]:
+        print("[Generate] No movement - returning original image")
+        return image_response(image_bytes, upload.content_type, prompt, 0, 0.0)
+    
+    # Generate seed
+    if seed is None:
+        import random
+        seed = random.randint(0, 2**32 - 1)
+    
+    # Queue on the GPU class; concurrent calls are coalesced by @modal.batched
+    result = await CameraAngle().generate_batch.remote.aio(image_bytes, prompt, seed, num_steps)
+    if "error" in result:
+        raise fastapi.HTTPException(status_code=result["status_code"], detail=result["error"])
+    
+    return image_response(result["image"], "image/webp", prompt, seed, result["inference_time_ms"])
+
+
+@app.function(image=web_image)
+@modal.fastapi_endpoint(method="GET")
+def health() -> dict:
+    """Health check endpoint."""
+    return {"status": "ok", "model": "Qwen Camera Angle Control"}
 
 
 # ============================================================================
@@ -269,7 +766,6 @@ def main():
     print("Testing Camera Angle Control...")
     
     # Test health endpoint
-    camera = CameraAngle()
-    print(camera.health.remote())
+    print(health.remote())
     
     print("Test complete!")
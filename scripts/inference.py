@@ -12,15 +12,25 @@ import argparse
 import json
 import sys
 import os
+from bisect import bisect_right
+from functools import lru_cache
 from pathlib import Path
+from types import MappingProxyType
 
 # Suppress warnings for cleaner output
 import warnings
 warnings.filterwarnings('ignore')
 
+# Optional: Aho-Corasick automaton for filename pattern matching
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
+
+@lru_cache(maxsize=1)
 def load_registry():
-    """Load model registry from config file."""
+    """Load model registry from config file (parsed once per process)."""
     registry_path = Path(__file__).parent.parent / 'config' / 'model-registry.json'
     if registry_path.exists():
         try:
@@ -34,6 +44,89 @@ def load_registry():
 # Load registry on module import
 MODEL_REGISTRY = load_registry()
 
+# Frozen lookups derived from the registry once
+_EMPTY = MappingProxyType({})
+
+if MODEL_REGISTRY and 'architectures' in MODEL_REGISTRY:
+    ARCHITECTURES = MappingProxyType(MODEL_REGISTRY['architectures'])
+    DETECTION_ORDER = tuple(MODEL_REGISTRY.get('detectionOrder', ARCHITECTURES.keys()))
+else:
+    ARCHITECTURES = _EMPTY
+    DETECTION_ORDER = ()
+
+_ARCH_DEFAULTS = MappingProxyType({
+    arch_key: MappingProxyType(arch.get('defaults', {}))
+    for arch_key, arch in ARCHITECTURES.items()
+})
+
+
+def build_detection_index(architectures, detection_order):
+    """
+    Precompile registry detection rules for detect_model_type.
+    
+    Returns:
+        Tuple of (pattern_matcher, size_ranges). Values are (priority, arch_key) where
+        priority is the position in detectionOrder, so the lowest priority match wins.
+    """
+    patterns = {}
+    size_ranges = []
+    for priority, arch_key in enumerate(detection_order):
+        arch = architectures.get(arch_key)
+        if not arch or 'detection' not in arch:
+            continue
+        
+        for pattern in arch['detection'].get('patterns', []):
+            clean_pattern = pattern.replace('*', '').lower()
+            if clean_pattern and clean_pattern not in patterns:
+                patterns[clean_pattern] = (priority, arch_key)
+        
+        if 'sizeRange' in arch['detection']:
+            min_size, max_size = arch['detection']['sizeRange']
+            size_ranges.append((min_size, max_size, priority, arch_key))
+    
+    if not patterns:
+        matcher = None
+    elif ahocorasick is not None:
+        # Single linear scan of the filename for all patterns at once
+        matcher = ahocorasick.Automaton()
+        for clean_pattern, value in patterns.items():
+            matcher.add_word(clean_pattern, value)
+        matcher.make_automaton()
+    else:
+        matcher = list(patterns.items())
+    
+    # Sorted by min size so candidates can be found with bisect
+    size_ranges.sort()
+    return matcher, size_ranges
+
+
+PATTERN_MATCHER, SIZE_RANGES = build_detection_index(ARCHITECTURES, DETECTION_ORDER)
+SIZE_RANGE_MINS = [size_range[0] for size_range in SIZE_RANGES]
+
+
+def match_filename_pattern(name: str):
+    """Return the highest-priority architecture whose pattern occurs in name, or None."""
+    if PATTERN_MATCHER is None:
+        return None
+    
+    if ahocorasick is not None:
+        matches = (value for _, value in PATTERN_MATCHER.iter(name))
+    else:
+        matches = (value for pattern, value in PATTERN_MATCHER if pattern in name)
+    
+    best = min(matches, default=None)
+    return best[1] if best else None
+
+
+def match_file_size(file_size: int):
+    """Return the highest-priority architecture whose sizeRange contains file_size, or None."""
+    candidates = SIZE_RANGES[:bisect_right(SIZE_RANGE_MINS, file_size)]
+    best = min(
+        ((priority, arch_key) for _, max_size, priority, arch_key in candidates if file_size <= max_size),
+        default=None
+    )
+    return best[1] if best else None
+
 
 def check_dependencies():
     """Check and report missing dependencies."""
@@ -73,36 +166,15 @@ def detect_model_type(model_path: str, file_size: int = 0) -> str:
     name = Path(model_path).stem.lower()
     
     # Use registry if available
-    if MODEL_REGISTRY and 'architectures' in MODEL_REGISTRY:
-        detection_order = MODEL_REGISTRY.get('detectionOrder', list(MODEL_REGISTRY['architectures'].keys()))
-        
-        for arch_key in detection_order:
-            arch = MODEL_REGISTRY['architectures'].get(arch_key)
-            if not arch or 'detection' not in arch:
-                continue
-            
-            # Check filename patterns
-            patterns = arch['detection'].get('patterns', [])
-            for pattern in patterns:
-                clean_pattern = pattern.replace('*', '').lower()
-                if clean_pattern and clean_pattern in name:
-                    return arch_key
-            
-            # Check file size if provided
-            if file_size > 0 and 'sizeRange' in arch['detection']:
-                min_size, max_size = arch['detection']['sizeRange']
-                if min_size <= file_size <= max_size:
-                    # Size matches - continue checking for better pattern match
-                    pass
-        
-        # Size-based fallback
-        if file_size > 0:
-            for arch_key in detection_order:
-                arch = MODEL_REGISTRY['architectures'].get(arch_key)
-                if arch and 'detection' in arch and 'sizeRange' in arch['detection']:
-                    min_size, max_size = arch['detection']['sizeRange']
-                    if min_size <= file_size <= max_size:
-                        return arch_key
+    arch_key = match_filename_pattern(name)
+    if arch_key:
+        return arch_key
+    
+    # Size-based fallback
+    if file_size > 0:
+        arch_key = match_file_size(file_size)
+        if arch_key:
+            return arch_key
     
     # Hardcoded fallback
     if 'sdxl' in name or 'sd_xl' in name:
@@ -118,12 +190,9 @@ def detect_model_type(model_path: str, file_size: int = 0) -> str:
     return 'sd15'
 
 
-def get_architecture_defaults(arch_key: str) -> dict:
-    """Get default parameters for an architecture from registry."""
-    if MODEL_REGISTRY and 'architectures' in MODEL_REGISTRY:
-        arch = MODEL_REGISTRY['architectures'].get(arch_key, {})
-        return arch.get('defaults', {})
-    return {}
+def get_architecture_defaults(arch_key: str):
+    """Get default parameters for an architecture from registry (read-only mapping)."""
+    return _ARCH_DEFAULTS.get(arch_key, _EMPTY)
 
 
 
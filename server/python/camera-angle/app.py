@@ -14,18 +14,13 @@ sys.path.insert(0, PROJECT_ROOT)
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Literal, Optional
+import torch
 import uvicorn
 
-from inference import (
-    load_model, 
-    is_model_loaded, 
-    get_model_status,
-    generate_camera_angle,
-    base64_to_image,
-    image_to_base64
-)
-from prompts import build_camera_prompt
+from inference import base64_to_bytes, image_to_base64
+from prompts import PROMPT_TEMPLATES, build_camera_prompt
+from worker import InferenceWorker
 
 
 # ============================================================================
@@ -38,6 +33,9 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Single inference process shared by all requests (created on startup)
+worker: Optional[InferenceWorker] = None
+
 # CORS - allow requests from TwitCanva frontend
 app.add_middleware(
     CORSMiddleware,
@@ -61,11 +59,13 @@ class GenerateRequest(BaseModel):
     wide_angle: bool = Field(False, description="Apply wide-angle lens effect")
     seed: Optional[int] = Field(None, description="Random seed for reproducibility")
     num_steps: int = Field(4, description="Number of inference steps")
+    output_format: Literal["webp", "png", "jpeg"] = Field("webp", description="Result image format (png = lossless)")
 
 
 class GenerateResponse(BaseModel):
     """Response body for camera angle generation."""
     image: str = Field(..., description="Base64 encoded result image")
+    media_type: Optional[str] = Field(None, description="MIME type of the result image (None if unknown)")
     prompt: str = Field(..., description="Generated camera movement prompt")
     seed: int = Field(..., description="Seed used for generation")
     inference_time_ms: float = Field(..., description="Inference time in milliseconds")
@@ -85,6 +85,11 @@ class StatusResponse(BaseModel):
 # ENDPOINTS
 # ============================================================================
 
+def is_model_loaded() -> bool:
+    """Check if the inference process has the model loaded."""
+    return worker is not None and worker.is_loaded()
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
@@ -94,7 +99,20 @@ async def health_check():
 @app.get("/status", response_model=StatusResponse)
 async def get_status():
     """Get model and GPU status."""
-    return get_model_status()
+    if is_model_loaded():
+        return await worker.status()
+    
+    # Still loading (or failed) - don't queue behind load_model()
+    if worker is not None and worker.last_status():
+        return worker.last_status()
+    return StatusResponse(
+        loaded=False,
+        device=None,
+        dtype=None,
+        gpu_available=torch.cuda.is_available(),
+        gpu_name=None,
+        gpu_memory_allocated=None
+    )
 
 
 @app.post("/generate", response_model=GenerateResponse)
@@ -105,6 +123,25 @@ async def generate(request: GenerateRequest):
     Takes an input image and camera control parameters,
     returns the transformed image.
     """
+    # Build the camera prompt from control values
+    prompt = build_camera_prompt(
+        rotation=request.rotation,
+        tilt=request.tilt,
+        zoom=request.zoom,
+        wide_angle=request.wide_angle
+    )
+    
+    # No-op: echo the input back without decoding or touching the model
+    if prompt == PROMPT_TEMPLATES["no_movement"]:
+        header, _, data = request.image.partition(",")
+        return GenerateResponse(
+            image=data or request.image,
+            media_type=header[5:].split(";")[0] if data and header.startswith("data:") else None,
+            prompt=prompt,
+            seed=request.seed or 0,
+            inference_time_ms=0.0
+        )
+    
     if not is_model_loaded():
         raise HTTPException(
             status_code=503, 
@@ -112,30 +149,20 @@ async def generate(request: GenerateRequest):
         )
     
     try:
-        # Build the camera prompt from control values
-        prompt = build_camera_prompt(
-            rotation=request.rotation,
-            tilt=request.tilt,
-            zoom=request.zoom,
-            wide_angle=request.wide_angle
-        )
-        
-        # Decode input image
-        input_image = base64_to_image(request.image)
-        
-        # Generate
-        result_image, seed, inference_time = generate_camera_angle(
-            image=input_image,
+        # Generate in the inference process
+        result_image, seed, inference_time = await worker.generate(
+            image_bytes=base64_to_bytes(request.image),
             prompt=prompt,
             seed=request.seed,
             num_steps=request.num_steps
         )
         
         # Encode result
-        result_base64 = image_to_base64(result_image)
+        result_base64 = image_to_base64(result_image, format=request.output_format)
         
         return GenerateResponse(
             image=result_base64,
+            media_type=f"image/{request.output_format}",
             prompt=prompt,
             seed=seed,
             inference_time_ms=inference_time
@@ -151,20 +178,28 @@ async def generate(request: GenerateRequest):
 
 @app.on_event("startup")
 async def startup_event():
-    """Load model on server startup."""
+    """Start the inference process; the model loads there in the background."""
+    global worker
+    
     print("=" * 60)
     print("Camera Angle Control API - Starting up...")
     print("=" * 60)
     
-    success = load_model()
-    if not success:
-        print("WARNING: Model failed to load. Server will return 503 errors.")
+    worker = InferenceWorker()
+    worker.start()
     
     print("=" * 60)
-    print(f"Server ready at http://localhost:8100")
+    print(f"Server ready at http://localhost:8100 (model loading in inference process)")
     print("=" * 60)
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the inference process."""
+    if worker is not None:
+        await worker.stop()
+
+
 # ============================================================================
 # MAIN
 # ============================================================================
@@ -175,5 +210,6 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8100,
         reload=False,  # Disable reload to avoid loading model multiple times
+        workers=1,  # The inference process is per server; extra workers would each spawn one
         log_level="info"
     )
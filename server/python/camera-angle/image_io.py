@@ -0,0 +1,138 @@
+"""
+image_io.py
+Fast image decoding, encoding and RGB normalization for the camera angle API.
+Uses libjpeg-turbo (PyTurboJPEG) and libspng (pyspng) when installed, else Pillow.
+"""
+
+from io import BytesIO
+import numpy as np
+from PIL import Image
+
+# Optional SIMD codecs - fall back to Pillow when missing
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+except ImportError:
+    TurboJPEG = None
+
+try:
+    import pyspng
+except ImportError:
+    pyspng = None
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+JPEG_MAGIC = b"\xff\xd8\xff"
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+
+# Result encoder settings per output format (WebP method 0 = fastest encode)
+ENCODE_OPTIONS = {
+    "WEBP": {"quality": 90, "method": 0},
+    "JPEG": {"quality": 90},
+    "PNG": {},
+}
+
+# Errors the fast decoders raise on inputs they can't handle; Pillow gets a second try
+DECODE_ERRORS = (OSError, RuntimeError, ValueError)
+
+_turbojpeg = None
+
+
+# ============================================================================
+# DECODING
+# ============================================================================
+
+def get_turbojpeg():
+    """Get the shared TurboJPEG handle, or None if libturbojpeg is unavailable."""
+    global _turbojpeg
+    
+    if _turbojpeg is None and TurboJPEG is not None:
+        try:
+            _turbojpeg = TurboJPEG()
+        except (OSError, RuntimeError):
+            # Python package installed but shared library missing
+            return None
+    return _turbojpeg
+
+
+def decode_image(data: bytes) -> Image.Image:
+    """
+    Decode image bytes to a PIL Image, dispatching on magic bytes.
+    JPEG -> libjpeg-turbo, 8-bit PNG -> libspng, everything else -> Pillow.
+    """
+    if data.startswith(JPEG_MAGIC):
+        jpeg = get_turbojpeg()
+        if jpeg is not None:
+            try:
+                return Image.fromarray(jpeg.decode(data, pixel_format=TJPF_RGB))
+            except DECODE_ERRORS:
+                pass  # CMYK/YCCK, arithmetic-coded, truncated, ... - let Pillow try
+    
+    if data.startswith(PNG_MAGIC) and pyspng is not None:
+        try:
+            pixels = pyspng.load(data)
+            if pixels.dtype.name == "uint8":
+                return Image.fromarray(pixels)
+        except DECODE_ERRORS:
+            pass  # Let Pillow try (and raise a proper error for broken files)
+    
+    return Image.open(BytesIO(data))
+
+
+# ============================================================================
+# ENCODING
+# ============================================================================
+
+def encode_image(image: Image.Image, format: str = "WEBP"):
+    """
+    Encode a PIL Image, returning a bytes-like object.
+    RGB PNG -> libspng, RGB JPEG -> libjpeg-turbo, everything else -> Pillow.
+    """
+    format = format.upper()
+    
+    if image.mode == "RGB":
+        # encode() only exists in the pyspng-seunglab build; PyPI's pyspng can only load
+        if format == "PNG" and hasattr(pyspng, "encode"):
+            # Non-interlaced: Adam7 (ProgressiveMode.PROGRESSIVE) is bigger and slower to encode
+            return pyspng.encode(np.asarray(image))
+        
+        if format == "JPEG":
+            jpeg = get_turbojpeg()
+            if jpeg is not None:
+                return jpeg.encode(np.asarray(image), quality=ENCODE_OPTIONS["JPEG"]["quality"], pixel_format=TJPF_RGB)
+    
+    buffer = BytesIO()
+    image.save(buffer, format=format, **ENCODE_OPTIONS.get(format, {}))
+    return buffer.getbuffer()
+
+
+# ============================================================================
+# NORMALIZATION
+# ============================================================================
+
+# Background for transparent pixels
+ALPHA_BACKGROUND = (255, 255, 255, 255)
+
+
+def to_rgb(image: Image.Image) -> Image.Image:
+    """
+    Normalize an image to RGB for the pipeline, decoding it exactly once.
+    Opaque alpha is simply dropped; real transparency is composited over white.
+    """
+    image.load()
+    
+    if image.mode == "RGB":
+        return image
+    
+    if image.mode == "LA":
+        image = image.convert("RGBA")
+    
+    if image.mode == "RGBA":
+        if image.getextrema()[3] == (255, 255):
+            return image.convert("RGB")
+        background = Image.new("RGBA", image.size, ALPHA_BACKGROUND)
+        return Image.alpha_composite(background, image).convert("RGB")
+    
+    # Palette, grayscale, CMYK, ...
+    return image.convert("RGB")
@@ -6,11 +6,17 @@ Uses 4-step fast inference with Rapid-AIO transformer.
 
 import torch
 import os
+import importlib.util
+import secrets
 import time
+import traceback
+from contextlib import contextmanager
 from PIL import Image
-from io import BytesIO
 import base64
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
+
+from image_io import encode_image, to_rgb
+from prompts import PROMPT_TEMPLATES
 
 # ============================================================================
 # CONFIGURATION
@@ -25,11 +31,61 @@ BASE_MODEL_ID = "Qwen/Qwen-Image-Edit-2509"
 TRANSFORMER_ID = "linoyts/Qwen-Image-Edit-Rapid-AIO"
 LORA_ID = "dx8152/Qwen-Edit-2509-Multiple-angles"
 LORA_WEIGHT_NAME = "镜头转换.safetensors"
+LORA_SCALE = 1.25
+
+# Pin the base model to a Hub commit SHA (None = latest on main)
+BASE_MODEL_REVISION = os.getenv("CAMERA_BASE_MODEL_REVISION") or None
+
+# Resolve everything from the local HF cache - no Hub HEAD/GET calls at startup
+LOCAL_FILES_ONLY = os.getenv("HF_HUB_OFFLINE") == "1"
+
+# Rapid-AIO transformer with the camera LoRA merged in (written by scripts/merge_lora.py)
+FUSED_TRANSFORMER_DIR = os.path.join(MODELS_DIR, "qwen-rapid-aio-angles-fused")
+
+# Written after the save finishes - an interrupted merge never counts as fused
+FUSED_TRANSFORMER_SENTINEL = os.path.join(FUSED_TRANSFORMER_DIR, "transformer", ".complete")
 
 # Inference settings
 DEFAULT_STEPS = 4
 DEFAULT_GUIDANCE = 1.0
 
+# Weight offloading strategy (override with CAMERA_OFFLOAD_MODE):
+#   "auto"       - "model" if enough VRAM is free, otherwise "group" (default)
+#   "model"      - move whole components (text encoder, transformer) to GPU when used
+#   "group"      - transfer one transformer block at a time on a side stream
+#                  (the text encoder is always offloaded per leaf module)
+#   "leaf"       - transfer one leaf module at a time on a side stream (lower VRAM)
+#   "sequential" - diffusers sequential CPU offload (lowest VRAM, slowest)
+#   "device_map" - load the bf16 transformer with accelerate device_map="auto": as many
+#                  blocks as fit live on the GPU permanently, the rest run from CPU
+OFFLOAD_MODE = os.getenv("CAMERA_OFFLOAD_MODE", "auto").lower()
+OFFLOAD_BLOCKS_PER_GROUP = 1  # diffusers only supports 1 with use_stream (it forces 1 otherwise)
+
+# Share of free VRAM the device-mapped transformer may claim (rest: activations, VAE, text encoder)
+DEVICE_MAP_VRAM_FRACTION = 0.7
+
+# torch.compile(mode="reduce-overhead") needs CUDA graphs support that landed in torch 2.3
+COMPILE_MIN_TORCH_VERSION = (2, 3)
+
+# Dummy input used to trigger compilation at startup. The graph is compiled with dynamic
+# shapes, so later prompt lengths, aspect ratios and batch sizes reuse it.
+WARMUP_IMAGE_SIZE = (512, 512)
+
+# Minimum free VRAM for "auto" to pick whole-component model offload
+# (the largest component must also fit, with RESIDENT_VRAM_FACTOR headroom)
+MODEL_OFFLOAD_MIN_FREE_VRAM = 8 * 1024**3
+
+# Transformer weight quantization on CUDA (override with CAMERA_QUANT_MODE):
+#   "nf4"  - bitsandbytes 4-bit NF4, ~4x smaller than bf16 (default)
+#   "fp8"  - torchao float8 weight-only, ~2x smaller; needs an Ada/Hopper GPU (sm_89+)
+#   "none" - bf16 weights
+QUANT_MODE = os.getenv("CAMERA_QUANT_MODE", "nf4").lower()
+FP8_MIN_CAPABILITY = (8, 9)
+
+# Keep the whole pipeline on the GPU when free VRAM exceeds this multiple of its weights
+# (headroom for activations and the VAE decode); offload otherwise
+RESIDENT_VRAM_FACTOR = 1.5
+
 # ============================================================================
 # GLOBAL MODEL STATE
 # ============================================================================
@@ -37,6 +93,8 @@ DEFAULT_GUIDANCE = 1.0
 _pipe = None
 _device = None
 _dtype = None
+_offload_mode = None
+_quant_mode = None
 
 
 # ============================================================================
@@ -54,9 +112,12 @@ def load_model() -> bool:
     Returns:
         True if model loaded successfully, False otherwise
     """
-    global _pipe, _device, _dtype
+    global _pipe, _device, _dtype, _offload_mode, _quant_mode
     
     try:
+        # Imported here, not at module level: app.py imports this module for its base64
+        # helpers, and only the inference process should pay for loading diffusers.
+        # This runs once per process, so it never touches the request path.
         from diffusers import QwenImageEditPlusPipeline, QwenImageTransformer2DModel
         
         print("[Camera Angle] Loading Qwen Image Edit model...")
@@ -68,37 +129,74 @@ def load_model() -> bool:
         
         if _device == "cpu":
             print("[Camera Angle] WARNING: Running on CPU - inference will be very slow!")
-        
-        # --- Determine model paths (local vs HuggingFace) ---
-        local_transformer_path = os.path.join(MODELS_DIR, "qwen-rapid-aio")
-        local_lora_path = os.path.join(MODELS_DIR, "loras", LORA_WEIGHT_NAME)
-        
-        # Check if local transformer exists
-        if os.path.exists(os.path.join(local_transformer_path, "transformer")):
-            transformer_source = local_transformer_path
-            print(f"[Camera Angle] Using LOCAL transformer: {local_transformer_path}")
         else:
-            transformer_source = TRANSFORMER_ID
-            print(f"[Camera Angle] Using HuggingFace transformer: {TRANSFORMER_ID}")
+            # TF32 for any remaining fp32 matmuls/convs; let cuDNN pick the fastest kernels
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.allow_tf32 = True
+            torch.backends.cudnn.benchmark = True
         
-        # Check if local LoRA exists
-        if os.path.exists(local_lora_path):
-            lora_source = MODELS_DIR  # Parent folder of loras/
-            print(f"[Camera Angle] Using LOCAL LoRA: {local_lora_path}")
+        # --- Determine model paths (pre-fused vs local vs HuggingFace) ---
+        lora_fused = os.path.exists(FUSED_TRANSFORMER_SENTINEL)
+        if lora_fused:
+            transformer_source = FUSED_TRANSFORMER_DIR
+            print(f"[Camera Angle] Using PRE-FUSED transformer (LoRA merged): {FUSED_TRANSFORMER_DIR}")
         else:
-            lora_source = LORA_ID
-            print(f"[Camera Angle] Using HuggingFace LoRA: {LORA_ID}")
+            transformer_source = get_transformer_source()
         
         # --- Load pipeline with fast transformer ---
         print(f"[Camera Angle] Loading base model: {BASE_MODEL_ID}")
         print("[Camera Angle] Using memory-efficient loading for low VRAM GPUs...")
         
-        # Load transformer - use low_cpu_mem_usage to reduce peak memory during loading
+        # Quantize transformer weights to NF4 so the pipeline can stay resident on the GPU
+        quantization_config = None
+        _quant_mode = "none"
+        if _device == "cuda" and QUANT_MODE == "nf4":
+            if importlib.util.find_spec("bitsandbytes") is None:
+                print("[Camera Angle] WARNING: bitsandbytes not installed - loading bf16 transformer")
+            else:
+                from diffusers import BitsAndBytesConfig
+                
+                print("[Camera Angle] Quantizing transformer to NF4 (bitsandbytes)...")
+                quantization_config = BitsAndBytesConfig(
+                    load_in_4bit=True,
+                    bnb_4bit_quant_type="nf4",
+                    bnb_4bit_compute_dtype=torch.bfloat16,
+                    bnb_4bit_use_double_quant=True,
+                )
+                _quant_mode = "nf4"
+        elif _device == "cuda" and QUANT_MODE == "fp8":
+            if torch.cuda.get_device_capability(0) < FP8_MIN_CAPABILITY:
+                print("[Camera Angle] WARNING: FP8 needs an Ada/Hopper GPU - loading bf16 transformer")
+            elif importlib.util.find_spec("torchao") is None:
+                print("[Camera Angle] WARNING: torchao not installed - loading bf16 transformer")
+            else:
+                _quant_mode = "fp8"  # Applied after the LoRA is fused into the bf16 weights
+        
+        # Shard the bf16 transformer across GPU/CPU at load time (weights materialize in place)
+        offload_mode = OFFLOAD_MODE
+        transformer_kwargs = {}
+        if _device == "cuda" and offload_mode == "device_map":
+            if _quant_mode != "none" or not lora_fused:
+                print("[Camera Angle] WARNING: device_map needs a pre-fused bf16 transformer "
+                      "(scripts/merge_lora.py, CAMERA_QUANT_MODE=none) - using 'group'")
+                offload_mode = "group"
+            else:
+                from accelerate.utils import get_max_memory
+                
+                max_memory = get_max_memory()
+                max_memory[0] = int(torch.cuda.mem_get_info(0)[0] * DEVICE_MAP_VRAM_FRACTION)
+                transformer_kwargs = {"device_map": "auto", "max_memory": max_memory}
+                print(f"[Camera Angle] Device-mapping transformer (GPU budget {max_memory[0] / 1024**3:.1f} GB)...")
+        
+        # Load transformer - use low_cpu_mem_usage (meta-device init) to reduce peak memory during loading
         transformer = QwenImageTransformer2DModel.from_pretrained(
             transformer_source,
             subfolder='transformer',
             torch_dtype=_dtype,
+            quantization_config=quantization_config,
             low_cpu_mem_usage=True,
+            local_files_only=LOCAL_FILES_ONLY,
+            **transformer_kwargs,
         )
         
         # Load pipeline - keep on CPU initially
@@ -107,37 +205,63 @@ def load_model() -> bool:
             transformer=transformer,
             torch_dtype=_dtype,
             low_cpu_mem_usage=True,
+            revision=BASE_MODEL_REVISION,
+            local_files_only=LOCAL_FILES_ONLY,
         )
         
-        # Enable SEQUENTIAL CPU offloading - moves each layer to GPU one at a time
-        # This uses minimal VRAM but is slower
-        print("[Camera Angle] Enabling sequential CPU offloading (layer-by-layer)...")
-        _pipe.enable_sequential_cpu_offload()
+        # --- Load camera angle LoRA (fused before offload hooks are attached) ---
+        if not lora_fused:
+            fuse_camera_lora(_pipe)
         
-        # --- Load camera angle LoRA ---
-        if os.path.exists(local_lora_path):
-            # Load from local file
-            _pipe.load_lora_weights(
-                os.path.join(MODELS_DIR, "loras"),
-                weight_name=LORA_WEIGHT_NAME,
-                adapter_name="angles"
-            )
-        else:
-            # Load from HuggingFace
-            _pipe.load_lora_weights(
-                LORA_ID,
-                weight_name=LORA_WEIGHT_NAME,
-                adapter_name="angles"
+        if _quant_mode == "fp8":
+            from torchao.quantization import float8_weight_only, quantize_
+            
+            # Quantizes layer by layer onto the GPU - the bf16 transformer never sits there whole
+            print("[Camera Angle] Quantizing transformer to FP8 weights (torchao)...")
+            quantize_(_pipe.transformer, float8_weight_only(), device="cuda")
+        
+        # Decode in tiles so the final VAE decode never spikes VRAM on top of the transformer
+        _pipe.vae.enable_tiling()
+        
+        # --- Weight placement ---
+        if _device == "cuda":
+            free_vram, _ = torch.cuda.mem_get_info(0)
+            host_bytes = sum(
+                get_host_weight_bytes(component)
+                for component in (_pipe.transformer, _pipe.text_encoder, _pipe.vae)
             )
+            
+            device_mapped = is_device_mapped(_pipe.transformer)
+            
+            if free_vram > RESIDENT_VRAM_FACTOR * host_bytes:
+                # Everything fits - no per-step host<->device weight traffic at all
+                print(f"[Camera Angle] Remaining weights ({host_bytes / 1024**3:.1f} GB) fit in VRAM - keeping pipeline on GPU")
+                if device_mapped:
+                    # accelerate already placed the transformer - move the other components only
+                    _pipe.text_encoder.to("cuda")
+                    _pipe.vae.to("cuda")
+                    _offload_mode = "device_map"
+                else:
+                    _pipe.to("cuda")
+                    _offload_mode = "none"
+            else:
+                # Page-locked host weights: offloaded copies run at full PCIe bandwidth
+                if not (is_quantized(_pipe.transformer) or device_mapped):
+                    pin_host_memory(_pipe.transformer)
+                pin_host_memory(_pipe.text_encoder)
+                if device_mapped:
+                    _offload_mode = "device_map+" + apply_offloading(_pipe, "group", free_vram)
+                else:
+                    _offload_mode = apply_offloading(_pipe, offload_mode, free_vram)
         
-        # Fuse LoRA for faster inference
-        _pipe.set_adapters(["angles"], adapter_weights=[1.0])
-        _pipe.fuse_lora(adapter_names=["angles"], lora_scale=1.25)
-        _pipe.unload_lora_weights()
+        # --- Compile the transformer (only when fully resident: model offload moves it
+        # off the GPU between calls and per-layer hooks break CUDA graphs) ---
+        if _device == "cuda" and _offload_mode == "none" and torch_version() >= COMPILE_MIN_TORCH_VERSION:
+            compile_transformer(_pipe)
         
         load_time = time.time() - start_time
         print(f"[Camera Angle] Model loaded successfully in {load_time:.1f}s")
-        print(f"[Camera Angle] Device: {_device} (with CPU offloading), Dtype: {_dtype}")
+        print(f"[Camera Angle] Device: {_device} (offload: {_offload_mode}), Dtype: {_dtype}, Quantization: {_quant_mode}")
         
         return True
         
@@ -148,11 +272,211 @@ def load_model() -> bool:
         
     except Exception as e:
         print(f"[Camera Angle] ERROR: Failed to load model - {e}")
-        import traceback
         traceback.print_exc()
         return False
 
 
+def get_transformer_source() -> str:
+    """Local Rapid-AIO transformer folder if downloaded, otherwise its HuggingFace ID."""
+    local_transformer_path = os.path.join(MODELS_DIR, "qwen-rapid-aio")
+    
+    # Check if local transformer exists
+    if os.path.exists(os.path.join(local_transformer_path, "transformer")):
+        print(f"[Camera Angle] Using LOCAL transformer: {local_transformer_path}")
+        return local_transformer_path
+    
+    print(f"[Camera Angle] Using HuggingFace transformer: {TRANSFORMER_ID}")
+    return TRANSFORMER_ID
+
+
+def fuse_camera_lora(pipe):
+    """Load the camera angle LoRA (local file or HuggingFace), fuse it and drop the adapter."""
+    local_lora_path = os.path.join(MODELS_DIR, "loras", LORA_WEIGHT_NAME)
+    
+    if os.path.exists(local_lora_path):
+        # Load from local file
+        print(f"[Camera Angle] Using LOCAL LoRA: {local_lora_path}")
+        pipe.load_lora_weights(
+            os.path.join(MODELS_DIR, "loras"),
+            weight_name=LORA_WEIGHT_NAME,
+            adapter_name="angles"
+        )
+    else:
+        # Load from HuggingFace
+        print(f"[Camera Angle] Using HuggingFace LoRA: {LORA_ID}")
+        pipe.load_lora_weights(
+            LORA_ID,
+            weight_name=LORA_WEIGHT_NAME,
+            adapter_name="angles",
+            local_files_only=LOCAL_FILES_ONLY
+        )
+    
+    # Fuse LoRA for faster inference
+    pipe.set_adapters(["angles"], adapter_weights=[1.0])
+    pipe.fuse_lora(adapter_names=["angles"], lora_scale=LORA_SCALE)
+    pipe.unload_lora_weights()
+
+
+def torch_version() -> Tuple[int, int]:
+    """Installed torch (major, minor) version."""
+    major, minor = torch.__version__.split(".")[:2]
+    return int(major), int(minor)
+
+
+def compile_transformer(pipe) -> bool:
+    """
+    Compile the transformer with CUDA graphs and run one warm-up generation so the
+    first request doesn't pay the compile cost. Falls back to eager on failure.
+    
+    Prompts are not padded here, so text length varies per prompt (the tokenizer splits
+    digits, so every rotation angle differs), as do aspect ratio and micro-batch size.
+    The graph is therefore compiled with dynamic shapes: new shapes record a new CUDA
+    graph instead of recompiling the transformer (dynamo still specializes size-1 dims,
+    so the first multi-image batch recompiles once), staying well under dynamo's
+    cache_size_limit instead of silently falling back to eager.
+    
+    Returns:
+        True if the compiled transformer is in use, False otherwise
+    """
+    eager_transformer = pipe.transformer
+    
+    try:
+        print("[Camera Angle] Compiling transformer (torch.compile, reduce-overhead)...")
+        start_time = time.time()
+        pipe.transformer = torch.compile(eager_transformer, mode="reduce-overhead", dynamic=True)
+        
+        # Same grad/autocast mode as real requests, so the compiled graph is reused
+        with inference_context():
+            pipe(
+                image=[Image.new("RGB", WARMUP_IMAGE_SIZE)],
+                prompt=PROMPT_TEMPLATES["rotate_right"].format(degrees=45),
+                num_inference_steps=DEFAULT_STEPS,
+                generator=torch.Generator(device="cuda").manual_seed(0),
+                true_cfg_scale=DEFAULT_GUIDANCE,
+            )
+        print(f"[Camera Angle] Compile warm-up done in {time.time() - start_time:.1f}s")
+        return True
+        
+    except Exception as e:
+        print(f"[Camera Angle] WARNING: torch.compile failed ({e}) - using eager transformer")
+        pipe.transformer = eager_transformer
+        return False
+
+
+def get_host_weight_bytes(module) -> int:
+    """
+    Size of a module's parameters and buffers still in host memory.
+    NF4 (bitsandbytes) and FP8 (torchao) weights are placed straight onto the GPU,
+    so those are already accounted for in the free VRAM reading.
+    """
+    return sum(
+        tensor.numel() * tensor.element_size()
+        for tensor in list(module.parameters()) + list(module.buffers())
+        if tensor.device.type == "cpu"
+    )
+
+
+def is_quantized(model) -> bool:
+    """Check if a model holds quantized weights (bitsandbytes config or torchao tensors)."""
+    if getattr(model, "hf_quantizer", None) is not None:
+        return True
+    return any(type(param.data).__module__.startswith("torchao") for param in model.parameters())
+
+
+def is_device_mapped(model) -> bool:
+    """Check if a model was dispatched across devices by accelerate (device_map)."""
+    return getattr(model, "hf_device_map", None) is not None
+
+
+def pin_host_memory(module) -> bool:
+    """
+    Move a CPU module's parameters and buffers into pinned (page-locked) memory.
+    Pinning a large model can fail on systems with little free RAM - weights then
+    simply stay pageable.
+    
+    Returns:
+        True if every tensor was pinned, False otherwise
+    """
+    try:
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            if tensor.device.type == "cpu" and not tensor.is_pinned():
+                tensor.data = tensor.data.pin_memory()
+        return True
+    except RuntimeError as e:
+        print(f"[Camera Angle] WARNING: Could not pin host memory ({e}) - using pageable weights")
+        return False
+
+
+def apply_offloading(pipe, mode: str, free_vram: int) -> str:
+    """
+    Attach CPU offload hooks to the pipeline for the given CAMERA_OFFLOAD_MODE.
+    The VAE is small, so it always stays resident on the GPU. A quantized (NF4/FP8) or
+    device-mapped transformer is already placed (and can't be offloaded layer by layer),
+    so it stays there and only the text encoder is offloaded.
+    
+    Returns:
+        The offload mode actually applied
+    """
+    offload_transformer = not (is_quantized(pipe.transformer) or is_device_mapped(pipe.transformer))
+    
+    if mode == "auto":
+        # Model offload holds one whole component on the GPU at a time - the largest must fit
+        largest_bytes = max(get_host_weight_bytes(pipe.transformer), get_host_weight_bytes(pipe.text_encoder))
+        model_offload_fits = free_vram > max(MODEL_OFFLOAD_MIN_FREE_VRAM, RESIDENT_VRAM_FACTOR * largest_bytes)
+        mode = "model" if model_offload_fits else "group"
+    
+    if mode == "model":
+        # One transfer per component per call instead of per-layer bookkeeping.
+        # The pipeline must still be on the CPU here - the hooks handle placement.
+        print("[Camera Angle] Enabling model CPU offloading (component-level)...")
+        pipe.enable_model_cpu_offload()
+        return mode
+    
+    if mode == "sequential" and not offload_transformer:
+        print("[Camera Angle] Sequential offload doesn't support a quantized transformer - using 'leaf'")
+        mode = "leaf"
+    
+    if mode == "sequential":
+        # Moves each leaf module to GPU one at a time - minimal VRAM, slowest
+        print("[Camera Angle] Enabling sequential CPU offloading (layer-by-layer)...")
+        pipe.enable_sequential_cpu_offload()
+        return mode
+    
+    if mode not in ("group", "leaf"):
+        print(f"[Camera Angle] WARNING: Unknown CAMERA_OFFLOAD_MODE '{mode}', using 'group'")
+        mode = "group"
+    
+    from diffusers.hooks import apply_group_offloading
+    
+    # Block-level groups copy a whole transformer block's weights in one go.
+    # use_stream prefetches group N+1 from pinned memory on a dedicated copy stream while
+    # group N computes; record_stream ties the onloaded tensors to the compute stream so
+    # they're freed without a per-group synchronize.
+    offload_kwargs = {
+        "onload_device": torch.device("cuda"),
+        "offload_device": torch.device("cpu"),
+        "use_stream": True,
+        "record_stream": True,
+        "non_blocking": True,
+    }
+    if mode == "group":
+        offload_kwargs["offload_type"] = "block_level"
+        offload_kwargs["num_blocks_per_group"] = OFFLOAD_BLOCKS_PER_GROUP
+    else:
+        offload_kwargs["offload_type"] = "leaf_level"
+    
+    print(f"[Camera Angle] Enabling {mode}-level CPU offloading (CUDA stream prefetch)...")
+    if offload_transformer:
+        apply_group_offloading(pipe.transformer, **offload_kwargs)
+    
+    # Block-level grouping only splits ModuleList/Sequential children of the module it is
+    # given. Qwen2.5-VL's children are just `model` and `lm_head`, so the whole ~16GB text
+    # encoder would become one group onloaded at once - always offload it per leaf instead.
+    apply_group_offloading(pipe.text_encoder, **{**offload_kwargs, "offload_type": "leaf_level"})
+    pipe.vae.to("cuda")
+    return mode
+
+
 def is_model_loaded() -> bool:
     """Check if the model is loaded and ready."""
     return _pipe is not None
@@ -174,6 +498,13 @@ def get_model_status() -> dict:
 # INFERENCE
 # ============================================================================
 
+@contextmanager
+def inference_context():
+    """No autograd bookkeeping at all, and bf16 autocast for stray fp32 ops on CUDA."""
+    with torch.inference_mode(), torch.autocast(device_type=_device, dtype=_dtype, enabled=_device == "cuda"):
+        yield
+
+
 def generate_camera_angle(
     image: Image.Image,
     prompt: str,
@@ -199,56 +530,135 @@ def generate_camera_angle(
     if not is_model_loaded():
         raise RuntimeError("Model not loaded. Call load_model() first.")
     
-    if prompt == "no camera movement":
+    if prompt == PROMPT_TEMPLATES["no_movement"]:
         return image, seed or 0, 0.0
     
     # Generate seed if not provided
     if seed is None:
-        import random
-        seed = random.randint(0, 2**32 - 1)
+        seed = secrets.randbits(32)
     
     generator = torch.Generator(device=_device).manual_seed(seed)
     
-    # Ensure image is RGB
-    if image.mode != "RGB":
-        image = image.convert("RGB")
+    # Ensure image is RGB (transparent PNGs are flattened onto white)
+    image = to_rgb(image)
     
     # Run inference
     start_time = time.time()
     
-    result = _pipe(
-        image=[image],
-        prompt=prompt,
-        num_inference_steps=num_steps,
-        generator=generator,
-        true_cfg_scale=guidance_scale,
-        num_images_per_prompt=1,
-    ).images[0]
+    with inference_context():
+        result = _pipe(
+            image=[image],
+            prompt=prompt,
+            num_inference_steps=num_steps,
+            generator=generator,
+            true_cfg_scale=guidance_scale,
+            num_images_per_prompt=1,
+        ).images[0]
     
     inference_time = (time.time() - start_time) * 1000  # Convert to ms
     
     return result, seed, inference_time
 
 
+def encode_prompt_batch(image: Image.Image, prompts: List[str]):
+    """
+    Encode several prompts against one input image into a padded embedding batch.
+    QwenImageEditPlusPipeline treats a list of images as multiple references for a
+    single prompt, so batches are passed to it as precomputed prompt_embeds instead.
+    """
+    import torch.nn.functional as F
+    from diffusers.pipelines.qwenimage.pipeline_qwenimage_edit_plus import (
+        CONDITION_IMAGE_SIZE,
+        calculate_dimensions,
+    )
+    
+    # Same condition image the pipeline would build internally
+    width, height = calculate_dimensions(CONDITION_IMAGE_SIZE, image.width / image.height)
+    condition_image = _pipe.image_processor.resize(image, height, width)
+    
+    with inference_context():
+        encoded = [
+            _pipe.encode_prompt(prompt=prompt, image=[condition_image], device=_pipe._execution_device)
+            for prompt in prompts
+        ]
+    max_len = max(embeds.shape[1] for embeds, _ in encoded)
+    
+    prompt_embeds = torch.cat([
+        F.pad(embeds, (0, 0, 0, max_len - embeds.shape[1])) for embeds, _ in encoded
+    ])
+    prompt_embeds_mask = torch.cat([
+        F.pad(
+            mask if mask is not None else torch.ones(embeds.shape[:2], dtype=torch.long, device=embeds.device),
+            (0, max_len - embeds.shape[1]),
+        )
+        for embeds, mask in encoded
+    ])
+    return prompt_embeds, prompt_embeds_mask
+
+
+def generate_camera_angle_batch(
+    image: Image.Image,
+    prompts: List[str],
+    seeds: List[Optional[int]],
+    num_steps: int = DEFAULT_STEPS,
+    guidance_scale: float = DEFAULT_GUIDANCE,
+) -> List[Tuple[Image.Image, int, float]]:
+    """
+    Generate several camera moves of the same input image in one pipeline call.
+    
+    Args:
+        image: Input PIL Image shared by every prompt
+        prompts: Camera movement prompts (from prompts.py)
+        seeds: One random seed per prompt (None for random)
+        num_steps: Number of inference steps (default 4)
+        guidance_scale: CFG scale (default 1.0)
+    
+    Returns:
+        One (result_image, seed_used, inference_time_ms) tuple per prompt
+    """
+    if len(prompts) == 1:
+        return [generate_camera_angle(image, prompts[0], seeds[0], num_steps, guidance_scale)]
+    
+    if not is_model_loaded():
+        raise RuntimeError("Model not loaded. Call load_model() first.")
+    
+    seeds = [secrets.randbits(32) if seed is None else seed for seed in seeds]
+    image = to_rgb(image)
+    
+    # Run inference - one denoising loop for the whole batch
+    start_time = time.time()
+    
+    prompt_embeds, prompt_embeds_mask = encode_prompt_batch(image, prompts)
+    with inference_context():
+        results = _pipe(
+            image=[image],
+            prompt_embeds=prompt_embeds,
+            prompt_embeds_mask=prompt_embeds_mask,
+            num_inference_steps=num_steps,
+            generator=[torch.Generator(device=_device).manual_seed(seed) for seed in seeds],
+            true_cfg_scale=guidance_scale,
+        ).images
+    
+    inference_time = (time.time() - start_time) * 1000  # Convert to ms
+    
+    return [(result, seed, inference_time) for result, seed in zip(results, seeds)]
+
+
 # ============================================================================
 # UTILITY FUNCTIONS
 # ============================================================================
 
-def image_to_base64(image: Image.Image, format: str = "PNG") -> str:
-    """Convert PIL Image to base64 string."""
-    buffer = BytesIO()
-    image.save(buffer, format=format)
-    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+def image_to_base64(image: Image.Image, format: str = "WEBP") -> str:
+    """Convert PIL Image to base64 string (WebP by default; pass format="PNG" for lossless)."""
+    return base64.b64encode(encode_image(image, format)).decode("ascii")
 
 
-def base64_to_image(base64_str: str) -> Image.Image:
-    """Convert base64 string to PIL Image."""
-    # Handle data URI format
-    if "," in base64_str:
-        base64_str = base64_str.split(",")[1]
+def base64_to_bytes(base64_str: str) -> bytes:
+    """Convert base64 string (optionally a data URI) to raw bytes."""
+    # Handle data URI format - single pass, no list allocation
+    header, separator, data = base64_str.partition(",")
     
-    image_data = base64.b64decode(base64_str)
-    return Image.open(BytesIO(image_data))
+    return base64.b64decode(data if separator else header)
 
 
 # ============================================================================
@@ -5,6 +5,8 @@ Converts rotation/tilt values to Chinese+English bilingual prompts.
 MATCHES LOGIC IN: modal/camera_angle.py
 """
 
+from functools import lru_cache
+
 # ============================================================================
 # PROMPT TEMPLATES
 # ============================================================================
@@ -20,6 +22,11 @@ PROMPT_TEMPLATES = {
     "no_movement": "no camera movement"
 }
 
+# Pre-formatted rotation prompts for every whole degree the UI can send
+MAX_ROTATION_DEGREES = 360
+_ROTATE_RIGHT = {d: PROMPT_TEMPLATES["rotate_right"].format(degrees=d) for d in range(MAX_ROTATION_DEGREES + 1)}
+_ROTATE_LEFT = {d: PROMPT_TEMPLATES["rotate_left"].format(degrees=d) for d in range(MAX_ROTATION_DEGREES + 1)}
+
 
 # ============================================================================
 # PROMPT BUILDER
@@ -40,27 +47,40 @@ def build_camera_prompt(
         zoom: Zoom level 0-10. Higher = closer.
         wide_angle: Whether to apply wide-angle lens effect (not used in modal currently)
     """
+    # Quantize to the values the prompt actually depends on, so the cache stays tiny
+    rotation_sign = (rotation > 0) - (rotation < 0)
+    tilt_sign = (tilt > 5) - (tilt < -5)
+    return _build_camera_prompt(rotation_sign, abs(int(rotation)), tilt_sign, zoom > 5, bool(wide_angle))
+
+
+@lru_cache(maxsize=4096)
+def _build_camera_prompt(
+    rotation_sign: int,
+    degrees: int,
+    tilt_sign: int,
+    close_up: bool,
+    wide_angle: bool
+) -> str:
+    """Memoized core of build_camera_prompt, keyed on the quantized control values."""
     prompt_parts = []
     
     # Rotation: horizontal camera movement around subject
-    if rotation != 0:
-        degrees = abs(int(rotation))
-        if rotation > 0:
-            # Positive rotation = camera moves to the right of subject
-            prompt_parts.append(PROMPT_TEMPLATES["rotate_right"].format(degrees=degrees))
-        else:
-            # Negative rotation = camera moves to the left of subject
-            prompt_parts.append(PROMPT_TEMPLATES["rotate_left"].format(degrees=degrees))
+    if rotation_sign > 0:
+        # Positive rotation = camera moves to the right of subject
+        prompt_parts.append(_ROTATE_RIGHT.get(degrees) or PROMPT_TEMPLATES["rotate_right"].format(degrees=degrees))
+    elif rotation_sign < 0:
+        # Negative rotation = camera moves to the left of subject
+        prompt_parts.append(_ROTATE_LEFT.get(degrees) or PROMPT_TEMPLATES["rotate_left"].format(degrees=degrees))
     
     # Tilt: vertical camera angle
     # The demo shows that mixing specific degrees for rotation with categorical tilt works best
-    if tilt > 5:
+    if tilt_sign > 0:
         prompt_parts.append(PROMPT_TEMPLATES["birds_eye"])
-    elif tilt < -5:
+    elif tilt_sign < 0:
         prompt_parts.append(PROMPT_TEMPLATES["worms_eye"])
     
     # Zoom
-    if zoom > 5:
+    if close_up:
         prompt_parts.append(PROMPT_TEMPLATES["close_up"])
     
     # Wide Angle (legacy support for local mode if needed)
@@ -0,0 +1,67 @@
+"""
+merge_lora.py
+One-time merge of the camera angle LoRA into the Rapid-AIO transformer.
+The server loads the merged checkpoint directly and skips the LoRA fuse on every startup.
+
+Run with: python server/python/camera-angle/scripts/merge_lora.py
+Output:   models/camera-control/qwen-rapid-aio-angles-fused/transformer/ (+ .complete marker)
+"""
+
+import os
+import sys
+import time
+
+# Import config and helpers from the camera-angle server package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import torch
+
+from inference import (
+    BASE_MODEL_ID,
+    BASE_MODEL_REVISION,
+    FUSED_TRANSFORMER_DIR,
+    FUSED_TRANSFORMER_SENTINEL,
+    LOCAL_FILES_ONLY,
+    fuse_camera_lora,
+    get_transformer_source,
+)
+
+
+def main():
+    from diffusers import QwenImageEditPlusPipeline, QwenImageTransformer2DModel
+    
+    start_time = time.time()
+    
+    print("[Merge LoRA] Loading transformer...")
+    transformer = QwenImageTransformer2DModel.from_pretrained(
+        get_transformer_source(),
+        subfolder='transformer',
+        torch_dtype=torch.bfloat16,
+        low_cpu_mem_usage=True,
+        local_files_only=LOCAL_FILES_ONLY,
+    )
+    
+    # Only the transformer is needed for fusing - skip text encoder and VAE
+    pipe = QwenImageEditPlusPipeline.from_pretrained(
+        BASE_MODEL_ID,
+        transformer=transformer,
+        text_encoder=None,
+        vae=None,
+        torch_dtype=torch.bfloat16,
+        revision=BASE_MODEL_REVISION,
+        local_files_only=LOCAL_FILES_ONLY,
+    )
+    
+    print("[Merge LoRA] Fusing camera angle LoRA...")
+    fuse_camera_lora(pipe)
+    
+    output_path = os.path.join(FUSED_TRANSFORMER_DIR, "transformer")
+    print(f"[Merge LoRA] Saving fused transformer to {output_path}...")
+    pipe.transformer.save_pretrained(output_path, safe_serialization=True)
+    open(FUSED_TRANSFORMER_SENTINEL, "w").close()
+    
+    print(f"[Merge LoRA] Done in {time.time() - start_time:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+worker.py
+Dedicated inference process for the camera angle API.
+The child process owns the CUDA context and the Qwen pipeline; the FastAPI
+process only enqueues jobs and awaits results, so the model is loaded once.
+Images cross the process boundary as shared-memory uint8 tensors (no pickling of
+pixel data), and concurrent jobs on the same input image are micro-batched into
+one pipeline call.
+"""
+
+import asyncio
+import hashlib
+import queue
+import time
+import uuid
+from typing import Optional, Tuple
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from PIL import Image
+
+from image_io import decode_image, to_rgb
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Message id the child sends once load_model() has finished
+READY_MESSAGE = "__ready__"
+
+# Message id that wakes the listener for good (child exited or server shutting down)
+EXIT_MESSAGE = "__exit__"
+
+# Seconds to wait for the child to exit on shutdown
+SHUTDOWN_TIMEOUT = 10
+
+# Seconds between result queue polls - the listener checks the child is alive in between
+RESULT_POLL_TIMEOUT = 1.0
+
+# Micro-batching: after the first generate job, gather more for up to BATCH_WINDOW_MS
+MAX_BATCH = 4
+BATCH_WINDOW_MS = 25
+
+
+# ============================================================================
+# SHARED-MEMORY IMAGES
+# ============================================================================
+
+def image_to_shared_tensor(image: Image.Image) -> torch.Tensor:
+    """Copy an RGB image into a (H, W, 3) uint8 tensor backed by shared memory."""
+    pixels = torch.empty((image.height, image.width, 3), dtype=torch.uint8).share_memory_()
+    pixels.numpy()[:] = np.asarray(image)
+    return pixels
+
+
+def shared_tensor_to_image(pixels: torch.Tensor) -> Image.Image:
+    """Wrap a (H, W, 3) uint8 tensor received from the other process as a PIL image."""
+    return Image.fromarray(pixels.numpy())
+
+
+def decode_to_shared_tensor(image_bytes: bytes) -> Tuple[bytes, torch.Tensor]:
+    """
+    Decode upload bytes to RGB shared-memory pixels (runs in the FastAPI process).
+    
+    Returns:
+        Tuple of (image_key for batching, pixels)
+    """
+    image_key = hashlib.sha1(image_bytes).digest()
+    return image_key, image_to_shared_tensor(to_rgb(decode_image(image_bytes)))
+
+
+# ============================================================================
+# WORKER PROCESS
+# ============================================================================
+
+def _collect_jobs(job_queue, first_job) -> Tuple[list, bool]:
+    """
+    Gather up to MAX_BATCH generate jobs arriving within BATCH_WINDOW_MS of the first.
+    
+    Returns:
+        Tuple of (jobs, stop_requested)
+    """
+    jobs = [first_job]
+    if first_job[1] != "generate":
+        return jobs, False
+    
+    deadline = time.monotonic() + BATCH_WINDOW_MS / 1000
+    generate_count = 1
+    while generate_count < MAX_BATCH:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            job = job_queue.get(timeout=remaining)
+        except queue.Empty:
+            break
+        if job is None:
+            return jobs, True
+        jobs.append(job)
+        generate_count += job[1] == "generate"
+    return jobs, False
+
+
+def _worker_main(job_queue, result_queue):
+    """Entry point of the inference process: load the model, then serve jobs until None."""
+    import inference
+    
+    loaded = inference.load_model()
+    result_queue.put((READY_MESSAGE, loaded, inference.get_model_status()))
+    
+    stop = False
+    while not stop:
+        job = job_queue.get()
+        if job is None:
+            break
+        jobs, stop = _collect_jobs(job_queue, job)
+        
+        # Jobs sharing an input image and step count run as one batched pipeline call
+        groups = {}
+        for job_id, kind, payload in jobs:
+            if kind == "status":
+                result_queue.put((job_id, True, inference.get_model_status()))
+                continue
+            image_key, pixels, prompt, seed, num_steps = payload
+            groups.setdefault((image_key, num_steps), []).append((job_id, payload))
+        
+        for (_, num_steps), group in groups.items():
+            try:
+                results = inference.generate_camera_angle_batch(
+                    image=shared_tensor_to_image(group[0][1][1]),
+                    prompts=[payload[2] for _, payload in group],
+                    seeds=[payload[3] for _, payload in group],
+                    num_steps=num_steps
+                )
+                for (job_id, _), (result, seed, inference_time) in zip(group, results):
+                    result_queue.put((job_id, True, (image_to_shared_tensor(result), seed, inference_time)))
+            except Exception as e:
+                for job_id, _ in group:
+                    result_queue.put((job_id, False, str(e)))
+    
+    result_queue.put((EXIT_MESSAGE, False, "Inference process exited"))
+
+
+# ============================================================================
+# CLIENT (runs in the FastAPI process)
+# ============================================================================
+
+class InferenceWorker:
+    """Async client for the single inference process."""
+    
+    def __init__(self):
+        ctx = mp.get_context("spawn")  # CUDA cannot be re-initialized in a forked child
+        self._job_queue = ctx.Queue()
+        self._result_queue = ctx.Queue()
+        self._process = ctx.Process(
+            target=_worker_main,
+            args=(self._job_queue, self._result_queue),
+            daemon=True
+        )
+        self._pending = {}
+        self._loaded = False
+        self._status = None
+        self._listener = None
+    
+    def start(self):
+        """Start the inference process. Model loading continues in the background."""
+        self._process.start()
+        self._listener = asyncio.get_running_loop().create_task(self._listen())
+    
+    async def stop(self):
+        """Ask the inference process to exit, wait for it, then shut the listener down."""
+        self._job_queue.put(None)
+        await asyncio.get_running_loop().run_in_executor(None, self._process.join, SHUTDOWN_TIMEOUT)
+        if self._process.is_alive():
+            self._process.terminate()
+        
+        # Wake the listener in case the child couldn't post its own exit message
+        self._result_queue.put((EXIT_MESSAGE, False, "Server shutting down"))
+        if self._listener:
+            await self._listener
+    
+    def is_loaded(self) -> bool:
+        """Check if the inference process is alive and its model is loaded."""
+        return self._loaded and self._process.is_alive()
+    
+    def last_status(self) -> Optional[dict]:
+        """Model status reported by the child when loading finished (None while loading)."""
+        return self._status
+    
+    async def status(self) -> dict:
+        """Get live model status from the inference process."""
+        return await self._submit("status", None)
+    
+    async def generate(
+        self,
+        image_bytes: bytes,
+        prompt: str,
+        seed: Optional[int],
+        num_steps: int
+    ) -> Tuple[Image.Image, int, float]:
+        """Run generate_camera_angle in the inference process. Same return value."""
+        # Decode off the event loop; the child receives ready RGB pixels
+        image_key, pixels = await asyncio.get_running_loop().run_in_executor(
+            None, decode_to_shared_tensor, image_bytes
+        )
+        result_pixels, seed, inference_time = await self._submit(
+            "generate", (image_key, pixels, prompt, seed, num_steps)
+        )
+        return shared_tensor_to_image(result_pixels), seed, inference_time
+    
+    async def _submit(self, kind: str, payload):
+        """Enqueue a job and await its result future."""
+        if not self._process.is_alive():
+            raise RuntimeError("Inference process is not running")
+        
+        job_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self._pending[job_id] = future
+        self._job_queue.put((job_id, kind, payload))
+        return await future
+    
+    async def _listen(self):
+        """Resolve pending futures as results arrive from the inference process."""
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await loop.run_in_executor(None, self._next_result)
+            
+            if message is None:
+                # Nothing queued - make sure the child didn't die (OOM-kill, segfault)
+                if self._process.is_alive():
+                    continue
+                message = (EXIT_MESSAGE, False, f"Inference process died (exit code {self._process.exitcode})")
+            
+            job_id, ok, payload = message
+            
+            if job_id == EXIT_MESSAGE:
+                self._loaded = False
+                self._fail_pending(payload)
+                return
+            
+            if job_id == READY_MESSAGE:
+                self._loaded = ok
+                self._status = payload
+                if not ok:
+                    print("WARNING: Model failed to load. Server will return 503 errors.")
+                continue
+            
+            future = self._pending.pop(job_id, None)
+            if future is None or future.done():
+                continue
+            if ok:
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(payload))
+    
+    def _next_result(self):
+        """Blocking result queue read with a timeout, so executor threads never hang."""
+        try:
+            return self._result_queue.get(timeout=RESULT_POLL_TIMEOUT)
+        except queue.Empty:
+            return None
+    
+    def _fail_pending(self, reason: str):
+        """Fail every in-flight job once the inference process is gone."""
+        print(f"WARNING: {reason}")
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(RuntimeError(reason))
+        self._pending.clear()
@@ -10,7 +10,7 @@
 // ============================================================================
 
 interface CameraAngleRequest {
-    image: string;      // base64-encoded image
+    image: Blob;        // source image file (sent as multipart/form-data)
     rotation: number;   // -180 to 180 degrees (horizontal)
     tilt: number;       // -90 to 90 degrees (vertical)
     zoom: number;       // 0-100 (close-up effect, mapped to 0-10 for API)
@@ -18,11 +18,11 @@ interface CameraAngleRequest {
     numSteps?: number;  // optional, default 4
 }
 
-interface CameraAngleResponse {
-    image: string;           // base64-encoded result
-    prompt: string;          // generated prompt
-    seed: number;            // seed used
-    inference_time_ms: number;
+// Response body is the raw result image (image/webp); metadata comes in headers
+interface CameraAngleResponseMeta {
+    prompt: string;          // X-Prompt (URI-encoded)
+    seed: number;            // X-Seed
+    inference_time_ms: number; // X-Inference-Time-Ms
 }
 
 // ============================================================================
@@ -39,29 +39,30 @@ const API_TIMEOUT_MS = 5 * 60 * 1000;
 // ============================================================================
 
 /**
- * Convert a URL or blob URL to a base64-encoded string
+ * Load a URL, blob URL or data URL as a Blob
  */
-async function urlToBase64(url: string): Promise<string> {
-    // Already base64
-    if (url.startsWith('data:image')) {
-        return url;
-    }
-
+async function urlToBlob(url: string): Promise<Blob> {
     try {
         const response = await fetch(url);
-        const blob = await response.blob();
-        return new Promise((resolve, reject) => {
-            const reader = new FileReader();
-            reader.onloadend = () => resolve(reader.result as string);
-            reader.onerror = reject;
-            reader.readAsDataURL(blob);
-        });
+        return await response.blob();
     } catch (error) {
-        console.error('[CameraAngle] Error converting URL to base64:', error);
+        console.error('[CameraAngle] Error loading image:', error);
         throw new Error('Failed to load image');
     }
 }
 
+/**
+ * Convert a Blob to a data URL
+ */
+function blobToDataUrl(blob: Blob): Promise<string> {
+    return new Promise((resolve, reject) => {
+        const reader = new FileReader();
+        reader.onloadend = () => resolve(reader.result as string);
+        reader.onerror = reject;
+        reader.readAsDataURL(blob);
+    });
+}
+
 /**
  * Fetch with timeout support
  */
@@ -121,22 +122,23 @@ export async function generateCameraAngle(
 
     console.log('[CameraAngle] Generating with:', { rotation, tilt, zoom });
 
-    // Convert image to base64
-    const imageBase64 = await urlToBase64(imageUrl);
-
-    // Strip data URL prefix if present for API
-    const base64Data = imageBase64.includes(',')
-        ? imageBase64.split(',')[1]
-        : imageBase64;
+    // Load source image as a file for multipart upload
+    const imageBlob = await urlToBlob(imageUrl);
 
     // Build request
     const request: CameraAngleRequest = {
-        image: base64Data,
+        image: imageBlob,
         rotation,
         tilt,
         zoom: zoom / 10, // Scale 0-100 to 0-10 for API
     };
 
+    const formData = new FormData();
+    formData.append('image', request.image, 'image');
+    formData.append('rotation', String(request.rotation));
+    formData.append('tilt', String(request.tilt));
+    formData.append('zoom', String(request.zoom));
+
     console.log('[CameraAngle] Calling Modal API...');
     const startTime = Date.now();
 
@@ -145,8 +147,7 @@ export async function generateCameraAngle(
             MODAL_ENDPOINT,
             {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(request),
+                body: formData,
             },
             API_TIMEOUT_MS
         );
@@ -157,7 +158,12 @@ export async function generateCameraAngle(
             throw new Error(`Camera angle API error: ${response.status} - ${errorText}`);
         }
 
-        const result: CameraAngleResponse = await response.json();
+        const result: CameraAngleResponseMeta = {
+            prompt: decodeURIComponent(response.headers.get('X-Prompt') || ''),
+            seed: Number(response.headers.get('X-Seed') || 0),
+            inference_time_ms: Number(response.headers.get('X-Inference-Time-Ms') || 0),
+        };
+        const imageDataUrl = await blobToDataUrl(await response.blob());
         const totalTime = Date.now() - startTime;
 
         console.log('[CameraAngle] Success!', {
@@ -166,9 +172,8 @@ export async function generateCameraAngle(
             seed: result.seed
         });
 
-        // Return as data URL
         return {
-            imageUrl: `data:image/png;base64,${result.image}`,
+            imageUrl: imageDataUrl,
             seed: result.seed,
             inferenceTimeMs: result.inference_time_ms
         };